@@ -1,17 +1,23 @@
-import pandas as pd
 import numpy as np
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 from datetime import datetime, timezone, timedelta
 from database import SessionLocal, news_collection
 from sqlalchemy.orm import Session
 import logging
+from profiling import span, profile_cycle
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize sentiment analyzer
-sentiment_analyzer = SentimentIntensityAnalyzer()
+# Sentiment analyzer is created on first use - loading the VADER lexicon is slow
+sentiment_analyzer = None
+
+def get_sentiment_analyzer():
+    global sentiment_analyzer
+    if sentiment_analyzer is None:
+        from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+        sentiment_analyzer = SentimentIntensityAnalyzer()
+    return sentiment_analyzer
 
 def analyze_news_sentiment():
     """
@@ -21,9 +27,10 @@ def analyze_news_sentiment():
     
     try:
         # Find news articles without sentiment scores
-        articles_to_analyze = list(news_collection.find({
-            "sentimentScore": {"$exists": False}
-        }))
+        with span("mongo"):
+            articles_to_analyze = list(news_collection.find({
+                "sentimentScore": {"$exists": False}
+            }))
         
         if not articles_to_analyze:
             logger.info("No new articles to analyze")
@@ -38,23 +45,25 @@ def analyze_news_sentiment():
             text_to_analyze = f"{headline}. {summary}"
             
             # Get sentiment scores
-            sentiment_scores = sentiment_analyzer.polarity_scores(text_to_analyze)
+            with span("vader"):
+                sentiment_scores = get_sentiment_analyzer().polarity_scores(text_to_analyze)
             compound_score = sentiment_scores['compound']  # -1 (negative) to +1 (positive)
             
             # Update the article with sentiment score
-            news_collection.update_one(
-                {"_id": article["_id"]},
-                {"$set": {
-                    "sentimentScore": compound_score,
-                    "sentimentAnalysis": {
-                        "positive": sentiment_scores['pos'],
-                        "neutral": sentiment_scores['neu'],
-                        "negative": sentiment_scores['neg'],
-                        "compound": compound_score
-                    },
-                    "analyzedAt": datetime.now(timezone.utc)
-                }}
-            )
+            with span("mongo"):
+                news_collection.update_one(
+                    {"_id": article["_id"]},
+                    {"$set": {
+                        "sentimentScore": compound_score,
+                        "sentimentAnalysis": {
+                            "positive": sentiment_scores['pos'],
+                            "neutral": sentiment_scores['neu'],
+                            "negative": sentiment_scores['neg'],
+                            "compound": compound_score
+                        },
+                        "analyzedAt": datetime.now(timezone.utc)
+                    }}
+                )
             analyzed_count += 1
         
         logger.info(f"Analyzed sentiment for {analyzed_count} articles")
@@ -119,8 +128,11 @@ def calculate_technical_indicators(ticker_symbol="AAPL", market="US"):
         full_symbol = get_full_symbol(ticker_symbol, market)
         
         import yfinance as yf
-        ticker = yf.Ticker(full_symbol)
-        history = ticker.history(period="1mo")  # 1 month of data
+        from rate_limiter import governed_call
+        history = governed_call(
+            "yfinance", ("history", full_symbol, "1mo", "1d"),
+            lambda: yf.Ticker(full_symbol).history(period="1mo")  # 1 month of data
+        )
         
         if history.empty:
             logger.warning(f"No historical data for {full_symbol}")
@@ -129,8 +141,9 @@ def calculate_technical_indicators(ticker_symbol="AAPL", market="US"):
         prices = history['Close'].tolist()
         
         # Calculate indicators
-        rsi = calculate_rsi(prices)
-        short_ma, long_ma = calculate_moving_averages(prices)
+        with span("indicators"):
+            rsi = calculate_rsi(prices)
+            short_ma, long_ma = calculate_moving_averages(prices)
         
         # Get current price
         current_price = prices[-1] if prices else None
@@ -171,10 +184,11 @@ def generate_insights(ticker_symbol="AAPL", market="US"):
     
     try:
         # Get latest news sentiment for this ticker and market
-        latest_news = list(news_collection.find({
-            "symbol": ticker_symbol.upper(),
-            "market": market.upper()
-        }).sort("publishedAt", -1).limit(5))
+        with span("mongo"):
+            latest_news = list(news_collection.find({
+                "symbol": ticker_symbol.upper(),
+                "market": market.upper()
+            }).sort("publishedAt", -1).limit(5))
         
         # Calculate average sentiment
         sentiment_scores = []
@@ -251,4 +265,5 @@ def test_ai_processor():
         print(insights)
 
 if __name__ == "__main__":
-    test_ai_processor()
\ No newline at end of file
+    with profile_cycle("ai processor"):
+        test_ai_processor()
\ No newline at end of file
@@ -0,0 +1,170 @@
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+# Where the ingestion side publishes the snapshot. /dev/shm keeps it in memory on Linux.
+SNAPSHOT_PATH = os.getenv(
+    "TICKERTRACKER_BOARD_SNAPSHOT",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "tickertracker_board.snap")
+)
+
+# How often (seconds) readers stat the file to pick up a new version
+RELOAD_CHECK_INTERVAL = 1.0
+
+# File layout (little endian):
+#   header                     magic, format, row count, snapshot version, publish time
+#   numeric columns            one packed float64 array of `count` values per column
+#   string offset table        uint32 offsets into the blob, column-major, count * len(STRING_COLUMNS) + 1
+#   string blob                UTF-8 text
+# Rows are sorted by (market, symbol) so readers can binary search without building an index.
+MAGIC = b"TTBS"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHHIQd4x")
+NUMERIC_COLUMNS = ["price", "change", "changePercent", "marketCap"]
+STRING_COLUMNS = ["symbol", "market", "full_symbol", "name", "currency"]
+
+
+def _number(value):
+    return math.nan if value is None else float(value)
+
+
+def _current_version(path):
+    try:
+        with open(path, "rb") as f:
+            magic, _, _, _, version, _ = HEADER.unpack(f.read(HEADER.size))
+        return version if magic == MAGIC else 0
+    except (OSError, struct.error):
+        return 0
+
+
+def publish_snapshot(rows, path=SNAPSHOT_PATH):
+    """
+    Write rows (dicts with NUMERIC_COLUMNS and STRING_COLUMNS keys) as a new
+    snapshot version. The file is written next to `path` and renamed over it,
+    so readers see either the old or the new version, never a partial one.
+    """
+    rows = sorted(rows, key=lambda row: (row["market"], row["symbol"]))
+    count = len(rows)
+    version = _current_version(path) + 1
+
+    numeric = b"".join(
+        struct.pack(f"<{count}d", *[_number(row.get(column)) for row in rows])
+        for column in NUMERIC_COLUMNS
+    )
+
+    blob = bytearray()
+    offsets = [0]
+    for column in STRING_COLUMNS:
+        for row in rows:
+            blob += (row.get(column) or "").encode("utf-8")
+            offsets.append(len(blob))
+
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, 0, count, version, time.time())
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(numeric)
+        f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return version
+
+
+class BoardSnapshot:
+    """Read-only, zero-copy view of one snapshot version"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.stat = os.fstat(f.fileno())
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, fmt, _, self.count, self.version, self.published_at = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise ValueError(f"Not a board snapshot (format {fmt}): {path}")
+
+        view = memoryview(self.map)
+        offset = HEADER.size
+        self.numeric = {}
+        for column in NUMERIC_COLUMNS:
+            size = self.count * 8
+            self.numeric[column] = view[offset:offset + size].cast("d")
+            offset += size
+
+        table_len = self.count * len(STRING_COLUMNS) + 1
+        self.offsets = view[offset:offset + table_len * 4].cast("I")
+        self.blob = view[offset + table_len * 4:]
+
+    def __len__(self):
+        return self.count
+
+    def _string(self, column, i):
+        index = STRING_COLUMNS.index(column) * self.count + i
+        return bytes(self.blob[self.offsets[index]:self.offsets[index + 1]]).decode("utf-8")
+
+    def _key(self, i):
+        return (self._string("market", i), self._string("symbol", i))
+
+    def row(self, i):
+        """Row i in the same shape as TickerOverview.to_dict()"""
+        data = {column: self._string(column, i) for column in STRING_COLUMNS}
+        for column in NUMERIC_COLUMNS:
+            value = self.numeric[column][i]
+            data[column] = None if math.isnan(value) else value
+        return data
+
+    def find(self, market, symbol):
+        i = bisect_left(range(self.count), (market, symbol), key=self._key)
+        if i < self.count and self._key(i) == (market, symbol):
+            return self.row(i)
+        return None
+
+    def rows(self, market=None):
+        if market is None:
+            return [self.row(i) for i in range(self.count)]
+        lo = bisect_left(range(self.count), market, key=lambda i: self._string("market", i))
+        hi = bisect_right(range(self.count), market, key=lambda i: self._string("market", i))
+        return [self.row(i) for i in range(lo, hi)]
+
+
+class SnapshotReader:
+    """Hands out the newest published snapshot, remapping when the file is replaced"""
+
+    def __init__(self, path=SNAPSHOT_PATH, check_interval=RELOAD_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self.snapshot = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def get(self):
+        """Current snapshot, or None if nothing has been published"""
+        now = time.monotonic()
+        if now - self.checked_at < self.check_interval:
+            return self.snapshot
+
+        with self.lock:
+            self.checked_at = now
+            try:
+                stat = os.stat(self.path)
+            except OSError:
+                self.snapshot = None
+                return None
+
+            current = self.snapshot
+            if current is None or (stat.st_ino, stat.st_mtime_ns) != (current.stat.st_ino, current.stat.st_mtime_ns):
+                try:
+                    # The old mapping is released once in-flight requests drop their reference
+                    self.snapshot = BoardSnapshot(self.path)
+                except (OSError, ValueError, struct.error):
+                    pass
+            return self.snapshot
+
+
+board_reader = SnapshotReader()
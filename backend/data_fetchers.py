@@ -1,99 +1,122 @@
 # Update the fetch_stock_data function to accept market parameter
 import yfinance as yf
 from sqlalchemy.orm import Session
-from database import SessionLocal, engine, news_collection
-from models import TickerOverview, Base
+from database import SessionLocal, news_collection, init_db
+from models import TickerOverview
 from datetime import datetime, timezone, timedelta
 import requests
-import numpy as np
-from market_config import MARKET_CONFIG, POPULAR_TICKERS, get_full_symbol
+from market_config import MARKET_CONFIG, POPULAR_TICKERS, get_full_symbol, get_base_symbol
 from ai_processor import analyze_news_sentiment, generate_insights
+from rate_limiter import governed_call, get_governor, ProviderUnavailable
+from history_pyramid import (store_bars, prune_bars, aggregate_frame, latest_bar_ts, load_frame,
+                             aggregation_start, RESOLUTION_RETENTION_DAYS)
+from board_snapshot import publish_snapshot
+from news_retention import run_news_retention
+from market_fetchers import fetch_market_data
+from profiling import span, profile_cycle
 
-# Ensure tables exist
-Base.metadata.create_all(bind=engine)
+# 1. FETCH STOCK PRICE DATA (using yfinance, through the batched market_fetchers engine)
+def fetch_stock_batch(ticker_symbols, market="US"):
+    print(f"Fetching data for {', '.join(ticker_symbols)} ({market})...")
 
-# Convert numpy types to Python native types for SQLAlchemy
-def convert_numpy_types(data):
-    converted = {}
-    for key, value in data.items():
-        if hasattr(value, 'item'):
-            converted[key] = value.item()
+    results = fetch_market_data(market, ticker_symbols)
+    for result in results:
+        full_symbol = get_full_symbol(result["symbol"], market)
+        if result["status"] == "ok":
+            data = result["data"]
+            print(f"Successfully updated {market} database for {result['symbol']}: ${data['price']} ({data['changePercent']}%)")
+        elif result["status"] == "no_data":
+            print(f"No data found for {full_symbol}")
         else:
-            converted[key] = value
-    return converted
+            print(f"An error occurred fetching {full_symbol}: {result['error']}")
+    return results
 
-# 1. FETCH STOCK PRICE DATA (using yfinance)
 def fetch_stock_data(ticker_symbol="AAPL", market="US"):
-    print(f"Fetching data for {ticker_symbol} ({market})...")
-    
-    # Convert to full symbol for the market
+    return fetch_stock_batch([ticker_symbol], market)[0]
+
+# Intraday and daily resolutions downloaded from yfinance: interval -> period used for the first download
+PYRAMID_DOWNLOADS = {"1m": "7d", "1h": "730d", "1d": "max"}
+# Coarser resolutions aggregated from the daily bars: interval -> resample rule
+PYRAMID_AGGREGATES = {"1wk": "W-MON", "1mo": "MS"}
+
+def _download_bars(full_symbol, interval, period, start):
+    # Re-fetch from the newest stored bar (it may have been partial); full period only on first build
+    kwargs = {"start": start} if start is not None else {"period": period}
+    return governed_call(
+        "yfinance", ("history", full_symbol, interval, str(start or period)),
+        lambda: yf.Ticker(full_symbol).history(interval=interval, **kwargs)
+    )
+
+# 1b. BUILD MULTI-RESOLUTION HISTORY (for long-range charts)
+def build_history_pyramid(ticker_symbol="AAPL", market="US"):
+    print(f"Building history pyramid for {ticker_symbol} ({market})...")
+
     full_symbol = get_full_symbol(ticker_symbol, market)
-    
+    symbol = ticker_symbol.upper()
+    now = datetime.now(timezone.utc)
+
     db = SessionLocal()
     try:
-        ticker = yf.Ticker(full_symbol)
-        info = ticker.info
-        history = ticker.history(period="2d")  # Get 2 days to calculate change
+        counts = {}
+        daily = None
+        for interval, period in PYRAMID_DOWNLOADS.items():
+            with span("db"):
+                latest = latest_bar_ts(db, symbol, market, interval)
+            retention = RESOLUTION_RETENTION_DAYS[interval]
+            if latest is not None and retention is not None and latest < now - timedelta(days=retention):
+                # Stored bars are older than yfinance serves at this interval; start over
+                latest = None
 
-        if history.empty or len(history) < 1:
-            print(f"No data found for {full_symbol}")
-            return
+            history = _download_bars(full_symbol, interval, period, latest)
+            if history.empty:
+                continue
+            with span("db"):
+                counts[interval] = store_bars(db, symbol, market, interval, history)
+            if interval == "1d":
+                daily = history
 
-        # Get the last available price
-        last_price = history['Close'].iloc[-1]
-        
-        # Calculate change from previous close if available
-        if len(history) > 1:
-            prev_close = history['Close'].iloc[-2]
-            change = last_price - prev_close
-            change_percent = (change / prev_close) * 100
-        else:
-            # If only one day of data, use open price or set to 0
-            prev_close = history['Open'].iloc[-1] if 'Open' in history else last_price
-            change = last_price - prev_close
-            change_percent = (change / prev_close) * 100 if prev_close != 0 else 0
+        if daily is not None:
+            if latest_bar_ts(db, symbol, market, "1mo") is not None:
+                # Only the weeks/months touched by the new daily bars need re-aggregating
+                with span("db"):
+                    start = aggregation_start(daily.index[0].to_pydatetime())
+                    daily = load_frame(db, symbol, market, "1d", start, tz=daily.index.tz)
+            for interval, rule in PYRAMID_AGGREGATES.items():
+                with span("db"):
+                    counts[interval] = store_bars(db, symbol, market, interval, aggregate_frame(daily, rule))
 
-        # Prepare data for our TickerOverview model
-        overview_data = {
-            "symbol": ticker_symbol.upper(),
-            "market": market,
-            "full_symbol": full_symbol,
-            "name": info.get('longName', ticker_symbol),
-            "price": float(round(last_price, 2)),
-            "change": float(round(change, 2)),
-            "changePercent": float(round(change_percent, 2)),
-            "marketCap": info.get('marketCap', 0),
-            "currency": MARKET_CONFIG[market]["currency"]
-        }
-
-        # Convert numpy types to Python native types
-        overview_data = convert_numpy_types(overview_data)
-
-        # Check if the ticker already exists in the database
-        existing_ticker = db.query(TickerOverview).filter(
-            TickerOverview.symbol == ticker_symbol.upper(),
-            TickerOverview.market == market
-        ).first()
-        
-        if existing_ticker:
-            # Update existing record
-            for key, value in overview_data.items():
-                setattr(existing_ticker, key, value)
-            existing_ticker.last_updated = datetime.now(timezone.utc)
-        else:
-            # Create a new record
-            new_ticker = TickerOverview(**overview_data)
-            db.add(new_ticker)
-            
-        db.commit()
-        print(f"Successfully updated {market} database for {ticker_symbol}: ${overview_data['price']} ({overview_data['changePercent']}%)")
+        with span("db"):
+            prune_bars(db, symbol, market)
+            db.commit()
+        print(f"Stored history pyramid for {ticker_symbol}: {counts}")
 
+    except ProviderUnavailable as e:
+        print(f"Skipping history pyramid for {full_symbol}: {e}")
+        db.rollback()
     except Exception as e:
-        print(f"An error occurred fetching {full_symbol}: {e}")
+        print(f"An error occurred building history for {full_symbol}: {e}")
         db.rollback()
     finally:
         db.close()
 
+def _download_news(url):
+    response = requests.get(url, timeout=10)
+    data = response.json()
+    if data.get('status') != 'ok' or 'articles' not in data:
+        if response.status_code == 429 or data.get('code') == 'rateLimited':
+            get_governor("newsapi").exhaust_quota()
+        raise RuntimeError(f"NewsAPI error: {data.get('code')} {data.get('message')}")
+    return data['articles']
+
+def has_stored_news(ticker_symbol, market):
+    # Compacted articles aren't served by /news, so they don't count
+    with span("mongo"):
+        return news_collection.find_one({
+            "symbol": ticker_symbol.upper(),
+            "market": market,
+            "compactedAt": {"$exists": False}
+        }) is not None
+
 # 2. FETCH NEWS DATA
 def fetch_news_data(ticker_symbol="AAPL", market="US"):
     print(f"Fetching news for {ticker_symbol} ({market})...")
@@ -111,14 +134,7 @@ def fetch_news_data(ticker_symbol="AAPL", market="US"):
             search_query = f"{ticker_symbol} cryptocurrency"
         
         url = f"https://newsapi.org/v2/everything?q={search_query}&language=en&sortBy=publishedAt&pageSize=5&apiKey={API_KEY}"
-        response = requests.get(url)
-        data = response.json()
-        
-        if data['status'] != 'ok' or 'articles' not in data:
-            print("Error fetching from NewsAPI, using fallback data")
-            return create_fallback_news(ticker_symbol, market)
-        
-        articles = data['articles']
+        articles = governed_call("newsapi", ("everything", search_query), _download_news, url)
         inserted_count = 0
         
         for article in articles:
@@ -136,18 +152,23 @@ def fetch_news_data(ticker_symbol="AAPL", market="US"):
             }
             
             # Insert into MongoDB
-            news_collection.update_one(
-                {"url": article['url']},
-                {"$set": news_document},
-                upsert=True
-            )
+            with span("mongo"):
+                news_collection.update_one(
+                    {"url": article['url']},
+                    # A re-fetched article is full again, so it must not stay marked as compacted
+                    {"$set": news_document, "$unset": {"compactedAt": ""}},
+                    upsert=True
+                )
             inserted_count += 1
         
         print(f"Inserted/Updated {inserted_count} real news articles for {ticker_symbol} in {market} market")
         
     except Exception as e:
+        # Covers ProviderUnavailable and upstream errors (rate limits, network) alike.
+        # Articles already in Mongo are the last-known-good data; only mock when there are none
         print(f"Error fetching news for {ticker_symbol}: {e}")
-        create_fallback_news(ticker_symbol, market)
+        if not has_stored_news(ticker_symbol, market):
+            create_fallback_news(ticker_symbol, market)
 
 def create_fallback_news(ticker_symbol, market):
     """Create fallback mock news if API fails"""
@@ -210,44 +231,65 @@ def create_fallback_news(ticker_symbol, market):
     for article in news_items:
         article["symbol"] = ticker_symbol.upper()
         article["market"] = market
-        news_collection.update_one(
-            {"url": article['url']},
-            {"$set": article},
-            upsert=True
-        )
+        with span("mongo"):
+            news_collection.update_one(
+                {"url": article['url']},
+                # A re-fetched article is full again, so it must not stay marked as compacted
+                {"$set": article, "$unset": {"compactedAt": ""}},
+                upsert=True
+            )
     
     print(f"Created {len(news_items)} fallback news articles for {ticker_symbol} in {market} market")
     
+def publish_board_snapshot():
+    """Publish every TickerOverview row to the shared-memory snapshot the API workers read"""
+    db = SessionLocal()
+    try:
+        with span("db"):
+            rows = [ticker.to_dict() for ticker in db.query(TickerOverview).all()]
+        version = publish_snapshot(rows)
+        print(f"Published board snapshot v{version} with {len(rows)} tickers")
+    except Exception as e:
+        print(f"An error occurred publishing the board snapshot: {e}")
+    finally:
+        db.close()
+
 def run_ai_analysis():
     """Run all AI analysis processes"""
     print("Running AI analysis...")
     analyze_news_sentiment()
     
     # Generate insights for all tracked tickers across markets
-    for market in ["US", "INDIA", "CRYPTO"]:
-        for ticker in POPULAR_TICKERS[market][:3]:  # First 3 tickers per market
-            base_ticker = ticker.replace(".NS", "").replace("-USD", "")
+    for market in MARKET_CONFIG:
+        for ticker in POPULAR_TICKERS.get(market, [])[:3]:  # First 3 tickers per market
+            base_ticker = get_base_symbol(ticker, market)
             insights = generate_insights(base_ticker, market)
             print(f"Insights for {base_ticker} ({market}): {insights}")
 
-if __name__ == "__main__":
+def run_ingestion_cycle():
+    """Fetch prices, history and news for every market, then run the analysis jobs"""
     # Fetch data for all markets
-    print("=== FETCHING US STOCK DATA ===")
-    for ticker in POPULAR_TICKERS["US"][:5]:  
-        fetch_stock_data(ticker, "US")
-        fetch_news_data(ticker, "US")
+    for market, config in MARKET_CONFIG.items():
+        print(f"\n=== FETCHING {config['name'].upper()} DATA ===")
+        base_tickers = [get_base_symbol(ticker, market) for ticker in POPULAR_TICKERS.get(market, [])[:5]]
+        fetch_stock_batch(base_tickers, market)
+        for base_ticker in base_tickers:
+            build_history_pyramid(base_ticker, market)
+            fetch_news_data(base_ticker, market)
     
-    print("\n=== FETCHING INDIAN STOCK DATA ===")
-    for ticker in POPULAR_TICKERS["INDIA"][:5]:
-        base_ticker = ticker.replace(".NS", "")
-        fetch_stock_data(base_ticker, "INDIA")
-        fetch_news_data(base_ticker, "INDIA")
-    
-    print("\n=== FETCHING CRYPTO DATA ===")
-    for ticker in POPULAR_TICKERS["CRYPTO"][:5]:
-        base_ticker = ticker.replace("-USD", "")
-        fetch_stock_data(base_ticker, "CRYPTO")
-        fetch_news_data(base_ticker, "CRYPTO")
+    # Let the API workers serve the new prices without a DB round-trip
+    publish_board_snapshot()
     
     # Run AI analysis after fetching data
-    run_ai_analysis()
\ No newline at end of file
+    run_ai_analysis()
+    
+    # Archive and compact old articles once their sentiment has been scored
+    run_news_retention()
+
+if __name__ == "__main__":
+    # Ensure tables exist
+    init_db()
+
+    # TICKERTRACKER_PROFILE_CYCLES=1 writes a profile of the cycle to profiles/
+    with profile_cycle("ingestion cycle"):
+        run_ingestion_cycle()
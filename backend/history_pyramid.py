@@ -0,0 +1,233 @@
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from models import PriceBar
+
+# Stored resolutions from finest to coarsest: (yfinance interval, seconds per bar)
+RESOLUTIONS = [
+    ("1m", 60),
+    ("1h", 60 * 60),
+    ("1d", 24 * 60 * 60),
+    ("1wk", 7 * 24 * 60 * 60),
+    ("1mo", 30 * 24 * 60 * 60),
+]
+
+# How far back yfinance serves each interval, and how long we keep it
+RESOLUTION_RETENTION_DAYS = {"1m": 7, "1h": 730, "1d": None, "1wk": None, "1mo": None}
+
+# Stored bars whose newest bar is older than this are stale (ingestion has stopped).
+# Leaves room for weekends and holidays when the markets don't trade.
+STALE_AFTER_DAYS = {"1m": 4, "1h": 4, "1d": 5, "1wk": 14, "1mo": 62}
+
+# Length of each chart period in days ("max" has no lower bound)
+PERIOD_DAYS = {
+    "1d": 1, "5d": 5, "1wk": 7, "1mo": 30, "3mo": 90, "6mo": 180,
+    "1y": 365, "2y": 730, "5y": 5 * 365, "10y": 10 * 365, "max": None,
+}
+
+# Read up to this many times max_points before downsampling with LTTB
+OVERSAMPLE = 4
+
+# Rows per bulk upsert statement
+STORE_CHUNK_SIZE = 1000
+
+# Assumed span of "max" when estimating bar counts
+MAX_PERIOD_DAYS = 50 * 365
+
+
+def period_start(period, now=None):
+    """First timestamp covered by a period, or None for the full history"""
+    now = now or datetime.now(timezone.utc)
+    if period == "ytd":
+        return datetime(now.year, 1, 1, tzinfo=timezone.utc)
+    if period not in PERIOD_DAYS:
+        raise ValueError(f"Unsupported period: {period}")
+    days = PERIOD_DAYS[period]
+    return now - timedelta(days=days) if days is not None else None
+
+
+def choose_resolution(period, max_points):
+    """
+    Pick the finest stored resolution whose bar count for the period is at most
+    OVERSAMPLE * max_points. Falls back to the coarsest resolution.
+    """
+    start = period_start(period)
+    if start is None:
+        span_days = MAX_PERIOD_DAYS
+    else:
+        span_days = (datetime.now(timezone.utc) - start).total_seconds() / 86400
+
+    for interval, seconds in RESOLUTIONS:
+        retention = RESOLUTION_RETENTION_DAYS[interval]
+        if retention is not None and span_days > retention:
+            continue
+        if span_days * 86400 / seconds <= max_points * OVERSAMPLE:
+            return interval
+    return RESOLUTIONS[-1][0]
+
+
+def frame_to_bars(history):
+    """Convert a yfinance history DataFrame to a list of bar dicts"""
+    bars = []
+    for date, row in history.iterrows():
+        bars.append({
+            "date": date.isoformat(),
+            "open": round(float(row['Open']), 2),
+            "high": round(float(row['High']), 2),
+            "low": round(float(row['Low']), 2),
+            "close": round(float(row['Close']), 2),
+            "volume": int(row['Volume'])
+        })
+    return bars
+
+
+def aggregate_frame(history, rule):
+    """Resample a daily OHLCV DataFrame into coarser bars labelled by period start (e.g. "W-MON", "MS")"""
+    aggregated = history.resample(rule, label="left", closed="left").agg({
+        "Open": "first",
+        "High": "max",
+        "Low": "min",
+        "Close": "last",
+        "Volume": "sum",
+    })
+    return aggregated.dropna(subset=["Close"])
+
+
+def lttb(bars, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling on closing prices.
+    Keeps the first and last bar and the most visually significant bar of each bucket.
+    """
+    n = len(bars)
+    if threshold >= n or threshold < 3:
+        return bars
+
+    sampled = [bars[0]]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        bucket_start = int(i * bucket_size) + 1
+        bucket_end = int((i + 1) * bucket_size) + 1
+
+        # Average of the next bucket is the third triangle point
+        next_start = bucket_end
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        next_count = next_end - next_start
+        avg_x = (next_start + next_end - 1) / 2
+        avg_y = sum(bars[j]["close"] for j in range(next_start, next_end)) / next_count
+
+        ax, ay = a, bars[a]["close"]
+        best, best_area = bucket_start, -1.0
+        for j in range(bucket_start, bucket_end):
+            area = abs((ax - avg_x) * (bars[j]["close"] - ay) - (ax - j) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+
+        sampled.append(bars[best])
+        a = best
+
+    sampled.append(bars[-1])
+    return sampled
+
+
+def store_bars(db, symbol, market, interval, history):
+    """Upsert a yfinance history DataFrame as bars of one resolution"""
+    rows = []
+    for date, row in history.iterrows():
+        rows.append({
+            "symbol": symbol,
+            "market": market,
+            "resolution": interval,
+            "ts": date.to_pydatetime().astimezone(timezone.utc),
+            "open": float(row['Open']),
+            "high": float(row['High']),
+            "low": float(row['Low']),
+            "close": float(row['Close']),
+            "volume": int(row['Volume']),
+        })
+
+    # Chunk to stay under Postgres' bind parameter limit
+    for i in range(0, len(rows), STORE_CHUNK_SIZE):
+        stmt = insert(PriceBar).values(rows[i:i + STORE_CHUNK_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["symbol", "market", "resolution", "ts"],
+            set_={key: stmt.excluded[key] for key in ("open", "high", "low", "close", "volume")}
+        )
+        db.execute(stmt)
+    return len(rows)
+
+
+def prune_bars(db, symbol, market):
+    """Drop intraday bars older than their retention window"""
+    now = datetime.now(timezone.utc)
+    for interval, days in RESOLUTION_RETENTION_DAYS.items():
+        if days is None:
+            continue
+        db.query(PriceBar).filter(
+            PriceBar.symbol == symbol,
+            PriceBar.market == market,
+            PriceBar.resolution == interval,
+            PriceBar.ts < now - timedelta(days=days)
+        ).delete(synchronize_session=False)
+
+
+def load_bars(db, symbol, market, interval, start=None):
+    """Stored bars for one resolution, oldest first"""
+    query = db.query(PriceBar).filter(
+        PriceBar.symbol == symbol,
+        PriceBar.market == market,
+        PriceBar.resolution == interval
+    )
+    if start is not None:
+        query = query.filter(PriceBar.ts >= start)
+    return [bar.to_dict() for bar in query.order_by(PriceBar.ts).all()]
+
+
+def bars_are_stale(bars, interval, now=None):
+    """Whether the newest of a list of bar dicts (oldest first) is too old to serve"""
+    now = now or datetime.now(timezone.utc)
+    newest = datetime.fromisoformat(bars[-1]["date"])
+    if newest.tzinfo is None:
+        newest = newest.replace(tzinfo=timezone.utc)
+    return now - newest > timedelta(days=STALE_AFTER_DAYS[interval])
+
+
+def latest_bar_ts(db, symbol, market, interval):
+    """Open time of the newest stored bar for one resolution, or None if nothing is stored"""
+    return db.query(func.max(PriceBar.ts)).filter(
+        PriceBar.symbol == symbol,
+        PriceBar.market == market,
+        PriceBar.resolution == interval
+    ).scalar()
+
+
+def load_frame(db, symbol, market, interval, start, tz=None):
+    """Stored bars from `start` as a yfinance-style OHLCV DataFrame (index converted to `tz`)"""
+    import pandas as pd
+
+    bars = db.query(PriceBar).filter(
+        PriceBar.symbol == symbol,
+        PriceBar.market == market,
+        PriceBar.resolution == interval,
+        PriceBar.ts >= start
+    ).order_by(PriceBar.ts).all()
+    frame = pd.DataFrame(
+        {
+            "Open": [bar.open for bar in bars],
+            "High": [bar.high for bar in bars],
+            "Low": [bar.low for bar in bars],
+            "Close": [bar.close for bar in bars],
+            "Volume": [bar.volume for bar in bars],
+        },
+        index=pd.DatetimeIndex([bar.ts for bar in bars], tz=timezone.utc)
+    )
+    return frame.tz_convert(tz) if tz is not None else frame
+
+
+def aggregation_start(first_new_bar):
+    """Earliest day whose week or month bar changes when daily bars from `first_new_bar` on are added"""
+    day = first_new_bar.replace(hour=0, minute=0, second=0, microsecond=0)
+    week_start = day - timedelta(days=day.weekday())
+    month_start = day.replace(day=1)
+    return min(week_start, month_start)
@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+
+# Budget for "import main" measured with python -X importtime (cumulative, milliseconds)
+IMPORT_TIME_BUDGET_MS = int(os.getenv("TICKERTRACKER_IMPORT_BUDGET_MS", "1500"))
+
+# Modules the API must not load until a request needs them
+DEFERRED_MODULES = ["yfinance", "pandas", "numpy", "vaderSentiment", "pymongo", "psycopg2", "ai_processor"]
+
+
+def measure_import(module="main"):
+    """
+    Import `module` in a fresh interpreter with -X importtime.
+    Returns (cumulative import time in ms, set of top-level packages that were imported).
+    """
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=backend_dir, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+
+    total_us = None
+    imported = set()
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue
+        imported.add(name.strip().split(".")[0])
+        if name.strip() == module:
+            total_us = int(cumulative)
+
+    return total_us / 1000, imported
+
+
+# Test function
+def test_import_time():
+    """Check that importing the API stays within budget and has no heavy imports or connections"""
+    print("Testing API import time...")
+    total_ms, imported = measure_import("main")
+
+    eager = sorted(set(DEFERRED_MODULES) & imported)
+    print(f"import main: {total_ms:.0f} ms (budget {IMPORT_TIME_BUDGET_MS} ms)")
+
+    assert not eager, f"Modules imported eagerly by main: {eager}"
+    assert total_ms <= IMPORT_TIME_BUDGET_MS, f"import main took {total_ms:.0f} ms, budget is {IMPORT_TIME_BUDGET_MS} ms"
+    print("Import time OK")
+
+
+if __name__ == "__main__":
+    test_import_time()
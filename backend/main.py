@@ -1,22 +1,51 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
 from market_config import MARKET_CONFIG, POPULAR_TICKERS
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from typing import List
-from ai_processor import generate_insights
-import yfinance as yf
+from typing import List, Optional
+from rate_limiter import governed_call, provider_status, ProviderUnavailable
+from request_coalescing import coalesce, coalescing_status
+from history_pyramid import choose_resolution, period_start, load_bars, frame_to_bars, lttb, bars_are_stale
+from board_snapshot import board_reader
+from symbol_search import symbol_universe
+from profiling import install_request_profiling, span
 import random
+import logging
+import os
 
 # Import from our new files
-from database import get_db, news_collection, engine  # Fixed import
-from models import TickerOverview, Base
+# yfinance, pandas/numpy and VADER (via ai_processor) are imported on first use to keep startup fast
+from database import get_db, news_collection, init_db, check_postgres, check_mongodb
+from models import TickerOverview
 
-# Create tables in the database (if they don't exist)
-Base.metadata.create_all(bind=engine)  # Fixed reference
+logger = logging.getLogger(__name__)
 
-app = FastAPI(title="TickerTracker API", description="API for financial data and insights", version="0.1")
+# Set TICKERTRACKER_MIGRATE_ON_STARTUP=0 when "python database.py" runs as a separate deploy step
+MIGRATE_ON_STARTUP = os.getenv("TICKERTRACKER_MIGRATE_ON_STARTUP", "1") == "1"
+startup_state = {"schema": not MIGRATE_ON_STARTUP}
+
+def run_migrations():
+    """Create tables in the database (if they don't exist). A down database doesn't stop the API from starting."""
+    try:
+        init_db()
+        startup_state["schema"] = True
+    except Exception as e:
+        logger.warning(f"Schema migration failed, will retry on readiness check: {e}")
+
+@asynccontextmanager
+async def lifespan(app):
+    if MIGRATE_ON_STARTUP:
+        await run_in_threadpool(run_migrations)
+    yield
+
+app = FastAPI(title="TickerTracker API", description="API for financial data and insights", version="0.1", lifespan=lifespan)
+# Opt-in per-request profiling (TICKERTRACKER_PROFILE_REQUESTS=1, then "X-Profile: 1" or ?profile=1)
+install_request_profiling(app)
 app.add_middleware( CORSMiddleware, allow_origins=["http://localhost:3000"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"] )
 
 # Pydantic model for response
@@ -36,28 +65,78 @@ class TickerOverviewResponse(BaseModel):
 def read_root():
     return {"message": "Welcome to TickerTracker API! The DB connection is live."}
 
+# Readiness probe - only route traffic here once the databases are reachable
+@app.get("/ready")
+def read_ready():
+    checks = {}
+    for name, check in (("postgres", check_postgres), ("mongodb", check_mongodb)):
+        try:
+            check()
+            checks[name] = "ok"
+        except Exception as e:
+            checks[name] = f"error: {e}"
+
+    if not startup_state["schema"] and checks["postgres"] == "ok":
+        run_migrations()
+    checks["schema"] = "ok" if startup_state["schema"] else "pending"
+
+    ready = all(status == "ok" for status in checks.values())
+    return JSONResponse(status_code=200 if ready else 503, content={"ready": ready, "checks": checks})
+
 
 # Update the overview endpoint to support markets
 @app.get("/api/ticker/{market}/{ticker_id}/overview", response_model=TickerOverviewResponse)
 def get_ticker_overview(market: str, ticker_id: str, db: Session = Depends(get_db)):
+    # Serve from the shared-memory board snapshot when the ingestion side has published one
+    snapshot = board_reader.get()
+    if snapshot is not None:
+        row = snapshot.find(market.upper(), ticker_id.upper())
+        if row is not None:
+            return row
+
     # Query the database for the ticker in the specific market
-    db_ticker = db.query(TickerOverview).filter(
-        TickerOverview.symbol == ticker_id.upper(),
-        TickerOverview.market == market.upper()
-    ).first()
+    with span("db"):
+        db_ticker = db.query(TickerOverview).filter(
+            TickerOverview.symbol == ticker_id.upper(),
+            TickerOverview.market == market.upper()
+        ).first()
 
     if db_ticker is None:
         raise HTTPException(status_code=404, detail="Ticker not found in this market")
     
     return db_ticker
 
+# Concurrent requests for the same ticker share one upstream fetch / Mongo query
+def ticker_key(market, ticker_id, **kwargs):
+    return (market.upper(), ticker_id.upper())
+
+# Bulk read of the market board (every ticker overview, optionally for one market)
+@app.get("/api/board")
+def get_board(market: Optional[str] = None, db: Session = Depends(get_db)):
+    """Get overview rows for all tracked tickers"""
+    market_upper = market.upper() if market else None
+    snapshot = board_reader.get()
+    if snapshot is not None:
+        return {"market": market_upper, "version": snapshot.version, "tickers": snapshot.rows(market_upper)}
+
+    query = db.query(TickerOverview)
+    if market_upper:
+        query = query.filter(TickerOverview.market == market_upper)
+    with span("db"):
+        tickers = [ticker.to_dict() for ticker in query.order_by(TickerOverview.market, TickerOverview.symbol).all()]
+    return {"market": market_upper, "version": None, "tickers": tickers}
+
 # Update the news endpoint
 @app.get("/api/ticker/{market}/{ticker_id}/news")
+@coalesce("news", key=ticker_key)
 def get_ticker_news(market: str, ticker_id: str):
-    news_list = list(news_collection.find({
-        "symbol": ticker_id.upper(),
-        "market": market.upper()
-    }).sort("publishedAt", -1).limit(10))
+    with span("mongo"):
+        news_list = list(news_collection.find({
+            "symbol": ticker_id.upper(),
+            "market": market.upper(),
+            # Compacted articles have lost their summary and source
+            "compactedAt": {"$exists": False}
+        }).sort("publishedAt", -1).limit(10))
     
     for news in news_list:
         news["_id"] = str(news["_id"])
@@ -65,8 +144,10 @@ def get_ticker_news(market: str, ticker_id: str):
 
 # Update the insights endpoint
 @app.get("/api/ticker/{market}/{ticker_id}/insights")
+@coalesce("insights", key=ticker_key)
 def get_ticker_insights(market: str, ticker_id: str):
     """Get AI-generated insights for a ticker"""
+    from ai_processor import generate_insights
     insights = generate_insights(ticker_id.upper(), market.upper())
     return {"ticker": ticker_id.upper(), "market": market.upper(), "insights": insights}
 
@@ -87,39 +168,94 @@ def get_popular_tickers(market: str):
 def get_supported_markets():
     """Get all supported markets"""
     return list(MARKET_CONFIG.keys())
+
+# Symbol search / autocomplete across all markets
+@app.get("/api/search")
+def search_symbols(q: str = Query(..., min_length=1, max_length=64),
+                   market: Optional[str] = None,
+                   limit: int = Query(10, ge=1, le=50)):
+    """Search symbols and company names by prefix"""
+    market_upper = market.upper() if market else None
+    if market_upper and market_upper not in MARKET_CONFIG:
+        raise HTTPException(status_code=404, detail="Market not found")
+    return {"query": q, "results": symbol_universe.search(q, market_upper, limit)}
+
+# Upstream provider health (rate limits, quota and circuit breaker state)
+@app.get("/api/providers/status")
+def get_provider_status():
+    """Get rate limiter and circuit breaker state for each upstream provider"""
+    return provider_status()
+
+# How many concurrent identical requests were collapsed per route
+@app.get("/api/coalescing/status")
+def get_coalescing_status():
+    """Get request coalescing metrics for each route"""
+    return coalescing_status()
 # ====================================================================================
 # Add new endpoint for historical data
 @app.get("/api/ticker/{market}/{ticker_id}/history")
-def get_ticker_history(market: str, ticker_id: str, period: str = "1mo"):
-    """Get historical price data for charting"""
+@coalesce("history", key=lambda market, ticker_id, period, max_points, **kwargs: (market.upper(), ticker_id.upper(), period, max_points))
+def get_ticker_history(market: str, ticker_id: str, period: str = "1mo",
+                       max_points: Optional[int] = Query(None, ge=3, le=5000),
+                       db: Session = Depends(get_db)):
+    """
+    Get historical price data for charting.
+    With max_points, bars come from the stored history pyramid at the finest
+    resolution that fits the period and are LTTB-downsampled to at most max_points.
+    """
     try:
         from market_config import get_full_symbol
         full_symbol = get_full_symbol(ticker_id, market)
-        
-        ticker = yf.Ticker(full_symbol)
-        history = ticker.history(period=period)
-        
-        if history.empty:
-            return {"error": "No historical data available"}
-        
-        # Convert to list of dictionaries for JSON response
+        interval = "1d"
         historical_data = []
-        for date, row in history.iterrows():
-            historical_data.append({
-                "date": date.isoformat(),
-                "open": round(float(row['Open']), 2),
-                "high": round(float(row['High']), 2),
-                "low": round(float(row['Low']), 2),
-                "close": round(float(row['Close']), 2),
-                "volume": int(row['Volume'])
-            })
+
+        if max_points is not None:
+            try:
+                interval = choose_resolution(period, max_points)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            try:
+                with span("db"):
+                    historical_data = load_bars(db, ticker_id.upper(), market.upper(), interval, period_start(period))
+            except Exception as e:
+                # Charts must keep working when Postgres is down - serve live data instead
+                logger.warning(f"Could not load stored bars for {full_symbol} ({interval}): {e}")
+                db.rollback()
+                historical_data = []
+            if historical_data and bars_are_stale(historical_data, interval):
+                logger.warning(f"Stored {interval} bars for {full_symbol} are stale, fetching live")
+                historical_data = []
+
+        if not historical_data:
+            # Nothing (fresh) stored for this ticker/resolution, or the DB is unavailable - fetch it live
+            import yfinance as yf
+            history = governed_call(
+                "yfinance", ("history", full_symbol, period, interval),
+                lambda: yf.Ticker(full_symbol).history(period=period, interval=interval)
+            )
+            
+            if history.empty:
+                return {"error": "No historical data available"}
+            
+            # Convert to list of dictionaries for JSON response
+            historical_data = frame_to_bars(history)
+
+        total_points = len(historical_data)
+        if max_points is not None:
+            historical_data = lttb(historical_data, max_points)
         
         return {
             "ticker": ticker_id.upper(),
             "market": market,
             "period": period,
+            "interval": interval,
+            "downsampled": len(historical_data) < total_points,
             "data": historical_data
         }
         
+    except HTTPException:
+        raise
+    except ProviderUnavailable as e:
+        raise HTTPException(status_code=503, detail=f"Historical data temporarily unavailable: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching historical data: {str(e)}")
\ No newline at end of file
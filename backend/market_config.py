@@ -5,21 +5,25 @@ MARKET_CONFIG = {
         "symbol_suffix": "",
         "data_source": "yfinance",
         "exchange": "",
-        "currency": "USD"
+        "currency": "USD",
+        "listing_file": "listings/us.csv"
     },
     "INDIA": {
         "name": "Indian Stock Market",
         "symbol_suffix": ".NS",  # NSE suffix for yfinance
         "data_source": "yfinance",
         "exchange": "NSE",
-        "currency": "INR"
+        "currency": "INR",
+        "listing_file": "listings/india.csv"
     },
     "CRYPTO": {
         "name": "Cryptocurrency",
         "symbol_suffix": "-USD",  # yfinance format for crypto
         "data_source": "yfinance",  # We'll use yfinance for crypto too
+        "name_field": "name",  # yfinance info key holding the display name (default "longName")
         "exchange": "",
-        "currency": "USD"
+        "currency": "USD",
+        "listing_file": "listings/crypto.csv"
     }
 }
 
@@ -42,6 +46,7 @@ def get_base_symbol(full_symbol, market):
     """Extract the base symbol from a full symbol"""
     if market in MARKET_CONFIG:
         suffix = MARKET_CONFIG[market]["symbol_suffix"]
-        if full_symbol.endswith(suffix):
+        # US symbols have no suffix, and full_symbol[:-0] would be ""
+        if suffix and full_symbol.endswith(suffix):
             return full_symbol[:-len(suffix)]
     return full_symbol
\ No newline at end of file
@@ -1,138 +1,266 @@
-import yfinance as yf
-import requests
-from sqlalchemy.orm import Session
-from database import SessionLocal
-from models import TickerOverview, MarketType
+import time
 from datetime import datetime, timezone
-import json
+from database import SessionLocal
+from models import TickerOverview
+from market_config import MARKET_CONFIG, POPULAR_TICKERS, get_full_symbol, get_base_symbol
+from rate_limiter import governed_call
+from profiling import span
 
-def fetch_us_stock_data(ticker_symbol):
-    """Fetch data for US stocks using Yahoo Finance"""
-    db = SessionLocal()
-    try:
-        ticker = yf.Ticker(ticker_symbol)
-        info = ticker.info
-        history = ticker.history(period="2d")
-        
-        if history.empty or len(history) < 2:
-            return None
-            
-        last_price = history['Close'].iloc[-1]
-        prev_close = history['Close'].iloc[-2]
-        change = last_price - prev_close
-        change_percent = (change / prev_close) * 100
-        
-        overview_data = {
-            "symbol": ticker_symbol.upper(),
-            "name": info.get('longName', ticker_symbol),
-            "price": float(round(last_price, 2)),
-            "change": float(round(change, 2)),
-            "changePercent": float(round(change_percent, 2)),
-            "marketCap": info.get('marketCap', 0),
-            "market": MarketType.US_STOCK,
-            "currency": "USD"
-        }
-        
-        # Update or create record
-        existing_ticker = db.query(TickerOverview).filter(
-            TickerOverview.symbol == ticker_symbol.upper(),
-            TickerOverview.market == MarketType.US_STOCK
-        ).first()
-        
-        if existing_ticker:
-            for key, value in overview_data.items():
-                setattr(existing_ticker, key, value)
-            existing_ticker.last_updated = datetime.now(timezone.utc)
-        else:
-            new_ticker = TickerOverview(**overview_data)
-            db.add(new_ticker)
-            
-        db.commit()
-        return overview_data
-        
-    except Exception as e:
-        print(f"Error fetching US stock {ticker_symbol}: {e}")
-        db.rollback()
+# Symbols per provider request / DB transaction
+DEFAULT_BATCH_SIZE = 10
+
+
+def yfinance_provider(full_symbols, need_info=None):
+    """
+    Fetch quotes for a batch of symbols: one yf.download call for all price
+    histories plus a (rate limited) info lookup for name and market cap for each
+    symbol in `need_info` (default: all). Other symbols get an empty info dict.
+    Returns {full_symbol: (info, history)}; symbols with no data are left out.
+    """
+    import yfinance as yf
+
+    histories = governed_call(
+        "yfinance", ("download", tuple(full_symbols), "2d"),
+        lambda: yf.download(full_symbols, period="2d", group_by="ticker", progress=False, threads=False)
+    )
+
+    quotes = {}
+    downloaded = set(histories.columns.get_level_values(0)) if not histories.empty else set()
+    for full_symbol in full_symbols:
+        if full_symbol not in downloaded:
+            continue
+        if need_info is not None and full_symbol not in need_info:
+            quotes[full_symbol] = ({}, histories[full_symbol].dropna(how="all"))
+            continue
+        try:
+            info = governed_call("yfinance", ("info", full_symbol), lambda: yf.Ticker(full_symbol).info)
+        except Exception as e:
+            # Price data is still useful without the name / market cap
+            print(f"No info for {full_symbol}: {e}")
+            info = {}
+        quotes[full_symbol] = (info, histories[full_symbol].dropna(how="all"))
+    return quotes
+
+
+def needs_info(ticker):
+    """Whether a stored row (or None) still needs the provider's per-symbol info lookup"""
+    return ticker is None or not ticker.name or ticker.name == ticker.symbol
+
+
+def build_overview(symbol, market, full_symbol, info, history, previous=None):
+    """
+    TickerOverview fields from provider data, or None if there is no price history.
+    Name and market cap missing from `info` are carried over from the `previous`
+    row, with the market cap scaled by the price move.
+    """
+    if history is None or history.empty:
         return None
-    finally:
-        db.close()
 
-def fetch_indian_stock_data(ticker_symbol):
-    """Fetch data for Indian stocks using Yahoo Finance (format: TICKER.NS)"""
-    # Indian stocks on Yahoo Finance use .NS suffix
-    yahoo_symbol = f"{ticker_symbol}.NS"
-    return fetch_us_stock_data(yahoo_symbol)
-
-def fetch_crypto_data(crypto_symbol):
-    """Fetch data for cryptocurrencies using Yahoo Finance"""
-    # Cryptos on Yahoo Finance use -USD suffix
-    yahoo_symbol = f"{crypto_symbol}-USD"
-    db = SessionLocal()
-    try:
-        ticker = yf.Ticker(yahoo_symbol)
-        info = ticker.info
-        history = ticker.history(period="2d")
-        
-        if history.empty or len(history) < 2:
-            return None
-            
-        last_price = history['Close'].iloc[-1]
-        prev_close = history['Close'].iloc[-2]
-        change = last_price - prev_close
-        change_percent = (change / prev_close) * 100
-        
-        overview_data = {
-            "symbol": crypto_symbol.upper(),
-            "name": info.get('name', crypto_symbol),
-            "price": float(round(last_price, 2)),
-            "change": float(round(change, 2)),
-            "changePercent": float(round(change_percent, 2)),
-            "marketCap": info.get('marketCap', 0),
-            "market": MarketType.CRYPTO,
-            "currency": "USD"
-        }
-        
-        # Update or create record
-        existing_ticker = db.query(TickerOverview).filter(
-            TickerOverview.symbol == crypto_symbol.upper(),
-            TickerOverview.market == MarketType.CRYPTO
-        ).first()
-        
-        if existing_ticker:
-            for key, value in overview_data.items():
-                setattr(existing_ticker, key, value)
-            existing_ticker.last_updated = datetime.now(timezone.utc)
+    config = MARKET_CONFIG[market]
+    last_price = float(history['Close'].iloc[-1])
+
+    # Calculate change from previous close if available, otherwise from today's open
+    if len(history) > 1:
+        prev_close = float(history['Close'].iloc[-2])
+    else:
+        prev_close = float(history['Open'].iloc[-1]) if 'Open' in history else last_price
+    change = last_price - prev_close
+    change_percent = (change / prev_close) * 100 if prev_close != 0 else 0
+
+    name = info.get(config.get("name_field", "longName")) or info.get('longName')
+    market_cap = info.get('marketCap')
+    if previous is not None:
+        name = name or previous.name
+        if market_cap is None and previous.marketCap:
+            market_cap = previous.marketCap * last_price / previous.price if previous.price else previous.marketCap
+    name = name or symbol
+    return {
+        "symbol": symbol,
+        "market": market,
+        "full_symbol": full_symbol,
+        "name": name,
+        "price": round(last_price, 2),
+        "change": round(change, 2),
+        "changePercent": round(change_percent, 2),
+        "marketCap": float(market_cap or 0),
+        "currency": config["currency"]
+    }
+
+
+def _load_batch(db, market, symbols):
+    """Stored overview rows for a batch of symbols, by symbol, with one SELECT"""
+    return {
+        ticker.symbol: ticker
+        for ticker in db.query(TickerOverview).filter(
+            TickerOverview.market == market,
+            TickerOverview.symbol.in_(symbols)
+        )
+    }
+
+
+def _save_batch(db, market, overviews, existing):
+    """Upsert a batch of overview rows (`existing` from _load_batch) with one commit"""
+    now = datetime.now(timezone.utc)
+    for overview in overviews:
+        ticker = existing.get(overview["symbol"])
+        if ticker:
+            for key, value in overview.items():
+                setattr(ticker, key, value)
+            ticker.last_updated = now
         else:
-            new_ticker = TickerOverview(**overview_data)
-            db.add(new_ticker)
-            
-        db.commit()
-        return overview_data
-        
-    except Exception as e:
-        print(f"Error fetching crypto {crypto_symbol}: {e}")
-        db.rollback()
-        return None
+            db.add(TickerOverview(**overview))
+    db.commit()
+
+
+def fetch_market_data(market, symbols=None, batch_size=DEFAULT_BATCH_SIZE,
+                      provider=yfinance_provider, session_factory=SessionLocal):
+    """
+    Fetch, compute and store overview data for any market in MARKET_CONFIG.
+    `symbols` are base symbols (default: the market's POPULAR_TICKERS).
+    Returns one result per symbol:
+        {"symbol", "market", "status": "ok" | "no_data" | "error", "data", "error", "timings"}
+    where timings holds the seconds spent in the symbol's batch on the provider
+    and the DB, and on computing this symbol.
+    """
+    market = market.upper()
+    if market not in MARKET_CONFIG:
+        raise ValueError(f"Unsupported market: {market}")
+    if symbols is None:
+        symbols = [get_base_symbol(ticker, market) for ticker in POPULAR_TICKERS.get(market, [])]
+
+    results = []
+    db = session_factory()
+    try:
+        for start in range(0, len(symbols), batch_size):
+            batch = [symbol.upper() for symbol in symbols[start:start + batch_size]]
+            full_symbols = {get_full_symbol(symbol, market): symbol for symbol in batch}
+            batch_results = []
+
+            started = time.perf_counter()
+            try:
+                with span("db"):
+                    existing = _load_batch(db, market, batch)
+            except Exception as e:
+                # Without the stored rows every symbol gets a full info lookup; the write below reports the error
+                print(f"Could not load stored {market} rows: {e}")
+                db.rollback()
+                existing = {}
+            load_time = time.perf_counter() - started
+            # Name and market cap rarely change, so only new or nameless rows pay for an info lookup
+            need_info = {full_symbol for full_symbol, symbol in full_symbols.items() if needs_info(existing.get(symbol))}
+
+            started = time.perf_counter()
+            try:
+                quotes = provider(list(full_symbols), need_info)
+                provider_error = None
+            except Exception as e:
+                quotes, provider_error = {}, e
+            provider_time = time.perf_counter() - started
+
+            overviews = []
+            for full_symbol, symbol in full_symbols.items():
+                result = {"symbol": symbol, "market": market, "status": "no_data", "data": None,
+                          "error": None, "timings": {"provider": provider_time}}
+                started = time.perf_counter()
+                try:
+                    if provider_error is not None:
+                        raise provider_error
+                    if full_symbol in quotes:
+                        info, history = quotes[full_symbol]
+                        with span("compute"):
+                            result["data"] = build_overview(symbol, market, full_symbol, info, history,
+                                                            existing.get(symbol))
+                        if result["data"] is not None:
+                            result["status"] = "ok"
+                            overviews.append(result["data"])
+                except Exception as e:
+                    result["status"], result["error"] = "error", str(e)
+                result["timings"]["compute"] = time.perf_counter() - started
+                batch_results.append(result)
+
+            started = time.perf_counter()
+            if overviews:
+                try:
+                    with span("db"):
+                        _save_batch(db, market, overviews, existing)
+                except Exception as e:
+                    db.rollback()
+                    for result in batch_results:
+                        if result["status"] == "ok":
+                            result["status"], result["error"] = "error", f"DB write failed: {e}"
+            db_time = load_time + time.perf_counter() - started
+
+            for result in batch_results:
+                result["timings"]["db"] = db_time
+            results.extend(batch_results)
     finally:
         db.close()
 
-def fetch_all_market_data():
+    return results
+
+
+def fetch_all_market_data(batch_size=DEFAULT_BATCH_SIZE):
     """Fetch data for all supported markets"""
     print("Fetching data for all markets...")
-    
-    # US Stocks
-    us_stocks = ["AAPL", "MSFT", "GOOGL", "TSLA", "AMZN"]
-    for symbol in us_stocks:
-        fetch_us_stock_data(symbol)
-    
-    # Indian Stocks (major companies)
-    indian_stocks = ["RELIANCE", "TCS", "INFY", "HDFCBANK", "ICICIBANK"]
-    for symbol in indian_stocks:
-        fetch_indian_stock_data(symbol)
-    
-    # Cryptocurrencies
-    cryptos = ["BTC", "ETH", "BNB", "ADA", "DOGE"]
-    for symbol in cryptos:
-        fetch_crypto_data(symbol)
-    
-    print("Completed fetching multi-market data")
\ No newline at end of file
+
+    results = []
+    for market in MARKET_CONFIG:
+        market_results = fetch_market_data(market, batch_size=batch_size)
+        ok = sum(1 for result in market_results if result["status"] == "ok")
+        print(f"{market}: updated {ok}/{len(market_results)} tickers")
+        for result in market_results:
+            if result["status"] != "ok":
+                print(f"  {result['symbol']}: {result['status']} {result['error'] or ''}")
+        results.extend(market_results)
+
+    print("Completed fetching multi-market data")
+    return results
+
+
+# Benchmark function
+def benchmark_fetch_engine(symbol_count=100, batch_size=DEFAULT_BATCH_SIZE, request_latency=0.02):
+    """
+    Compare one-symbol-per-round-trip (the old per-symbol path: a history and an
+    info request per symbol) with the batched engine, on a cold database (every
+    row needs its info lookup) and on the next, warm cycle. The stub provider
+    charges `request_latency` for the batch download and for each info lookup,
+    like yfinance_provider. Uses an in-memory SQLite database.
+    """
+    import pandas as pd
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    requests_made = []
+
+    def stub_provider(full_symbols, need_info=None):
+        lookups = [symbol for symbol in full_symbols if need_info is None or symbol in need_info]
+        requests_made.append(1 + len(lookups))
+        time.sleep(request_latency * (1 + len(lookups)))
+        index = pd.date_range(end="2025-01-02", periods=2, freq="D")
+        history = pd.DataFrame({"Open": [100.0, 101.0], "Close": [101.0, 102.5]}, index=index)
+        return {
+            symbol: ({"longName": f"{symbol} Inc.", "marketCap": 1e9} if symbol in lookups else {}, history)
+            for symbol in full_symbols
+        }
+
+    symbols = [f"SYM{i}" for i in range(symbol_count)]
+    print(f"Benchmarking {symbol_count} symbols, {request_latency * 1000:.0f} ms per provider request...")
+    for label, size in (("per-symbol", 1), (f"batched ({batch_size})", batch_size)):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        TickerOverview.__table__.create(bind=engine)
+        session_factory = sessionmaker(bind=engine)
+        for cycle in ("cold", "warm"):
+            requests_made.clear()
+            started = time.perf_counter()
+            results = fetch_market_data("US", symbols, batch_size=size, provider=stub_provider,
+                                        session_factory=session_factory)
+            elapsed = time.perf_counter() - started
+            assert all(result["status"] == "ok" for result in results)
+            assert all(result["data"]["name"] == f"{result['symbol']} Inc." for result in results)
+            print(f"{label}, {cycle}: {elapsed:.3f} s ({elapsed / symbol_count * 1000:.2f} ms/symbol, "
+                  f"{sum(requests_made)} provider requests)")
+
+
+if __name__ == "__main__":
+    benchmark_fetch_engine()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, UniqueConstraint
 from database import Base
 from datetime import datetime, timezone
 
@@ -28,4 +28,32 @@ class TickerOverview(Base):
             "changePercent": self.changePercent,
             "marketCap": self.marketCap,
             "currency": self.currency
-        }
\ No newline at end of file
+        }
+
+class PriceBar(Base):
+    """OHLCV bar at one resolution of the history pyramid (1m, 1h, 1d, 1wk, 1mo)"""
+    __tablename__ = "price_bars"
+    __table_args__ = (
+        UniqueConstraint("symbol", "market", "resolution", "ts", name="uq_price_bars_symbol_market_resolution_ts"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    symbol = Column(String, nullable=False)  # Base symbol (e.g., "AAPL")
+    market = Column(String, nullable=False)
+    resolution = Column(String, nullable=False)  # yfinance interval (e.g., "1d")
+    ts = Column(DateTime(timezone=True), nullable=False)  # Bar open time
+    open = Column(Float)
+    high = Column(Float)
+    low = Column(Float)
+    close = Column(Float)
+    volume = Column(BigInteger)
+
+    def to_dict(self):
+        return {
+            "date": self.ts.isoformat(),
+            "open": round(self.open, 2),
+            "high": round(self.high, 2),
+            "low": round(self.low, 2),
+            "close": round(self.close, 2),
+            "volume": self.volume
+        }
@@ -0,0 +1,141 @@
+import gzip
+import json
+import os
+from datetime import datetime, timezone, timedelta
+from database import mongodb, news_collection
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Articles keep every field for this many days, then are compacted
+NEWS_FULL_RETENTION_DAYS = int(os.getenv("TICKERTRACKER_NEWS_FULL_DAYS", "30"))
+# Compacted articles are removed from Mongo by a TTL index this many days after compaction
+NEWS_COMPACT_RETENTION_DAYS = int(os.getenv("TICKERTRACKER_NEWS_COMPACT_DAYS", "365"))
+# Full documents are archived here before compaction, partitioned by market and month
+NEWS_ARCHIVE_DIR = os.getenv(
+    "TICKERTRACKER_NEWS_ARCHIVE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive", "news")
+)
+COMPACTION_BATCH_SIZE = 1000
+
+# Fields left on a compacted article
+COMPACT_FIELDS = ["symbol", "market", "headline", "url", "publishedAt", "sentimentScore"]
+
+try:
+    import zstandard
+except ImportError:  # Fall back to gzip when zstandard isn't installed
+    zstandard = None
+
+ARCHIVE_SUFFIX = ".jsonl.zst" if zstandard else ".jsonl.gz"
+
+
+def ensure_news_indexes():
+    """Indexes for the API's newest-articles-per-ticker query, URL upserts, compaction and compacted-article expiry"""
+    news_collection.create_index([("symbol", 1), ("market", 1), ("publishedAt", -1)], name="symbol_market_published")
+    news_collection.create_index("url", name="url")
+    # Lets compaction find not-yet-compacted articles by age without a collection scan
+    news_collection.create_index([("compactedAt", 1), ("publishedAt", 1)], name="compacted_published")
+    # publishedAt is stored as an ISO string, so TTL expiry keys on the BSON date set at compaction
+    from pymongo.errors import OperationFailure
+    expire_after = NEWS_COMPACT_RETENTION_DAYS * 24 * 60 * 60
+    try:
+        news_collection.create_index("compactedAt", name="compacted_ttl", expireAfterSeconds=expire_after)
+    except OperationFailure:
+        # The retention window changed - update the existing TTL index in place
+        mongodb.command("collMod", news_collection.name,
+                        index={"name": "compacted_ttl", "expireAfterSeconds": expire_after})
+
+
+def archive_path(market, month):
+    return os.path.join(NEWS_ARCHIVE_DIR, market or "UNKNOWN", f"{month}{ARCHIVE_SUFFIX}")
+
+
+def write_archive(path, documents):
+    """
+    Append documents as JSON lines to a compressed archive. Each call writes a new
+    zstd frame / gzip member, and both formats read back concatenated frames as one stream.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = "".join(json.dumps(doc, default=str) + "\n" for doc in documents).encode("utf-8")
+    if zstandard:
+        data = zstandard.ZstdCompressor(level=10).compress(data)
+    else:
+        data = gzip.compress(data)
+    with open(path, "ab") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_archive(path):
+    """Iterate over the documents in an archive file"""
+    with open(path, "rb") as f:
+        if path.endswith(".zst"):
+            if not zstandard:
+                raise RuntimeError("zstandard is required to read .zst archives")
+            reader = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+            lines = reader.read().decode("utf-8").splitlines()
+        else:
+            lines = gzip.decompress(f.read()).decode("utf-8").splitlines()
+    for line in lines:
+        yield json.loads(line)
+
+
+def _archive_and_compact(batch):
+    partitions = {}
+    for doc in batch:
+        month = str(doc.get("publishedAt", ""))[:7] or "unknown"
+        partitions.setdefault((doc.get("market"), month), []).append(doc)
+
+    # Archive first so a crash before compaction only means the batch is archived again next run
+    for (market, month), documents in partitions.items():
+        write_archive(archive_path(market, month), documents)
+
+    unset = {field: "" for doc in batch for field in doc if field not in COMPACT_FIELDS and field != "_id"}
+    update = {"$set": {"compactedAt": datetime.now(timezone.utc)}}
+    if unset:
+        update["$unset"] = unset
+    news_collection.update_many({"_id": {"$in": [doc["_id"] for doc in batch]}}, update)
+
+
+def compact_old_news(full_retention_days=NEWS_FULL_RETENTION_DAYS):
+    """Archive and compact articles published more than `full_retention_days` ago"""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=full_retention_days)).strftime("%Y-%m-%dT%H:%M:%S")
+    logger.info(f"Compacting news published before {cutoff}...")
+
+    # ISO strings (NewsAPI's "...Z" and isoformat()'s "+00:00") sort chronologically as text.
+    # Sorting on publishedAt keeps the walk on the compacted_published index (no in-memory sort)
+    cursor = news_collection.find({
+        "publishedAt": {"$lt": cutoff},
+        "compactedAt": {"$exists": False}
+    }).sort("publishedAt", 1).batch_size(COMPACTION_BATCH_SIZE)
+
+    compacted = 0
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= COMPACTION_BATCH_SIZE:
+            _archive_and_compact(batch)
+            compacted += len(batch)
+            batch = []
+    if batch:
+        _archive_and_compact(batch)
+        compacted += len(batch)
+
+    logger.info(f"Compacted {compacted} news articles")
+    return compacted
+
+
+def run_news_retention():
+    """Ensure indexes and compact old articles"""
+    try:
+        ensure_news_indexes()
+        return compact_old_news()
+    except Exception as e:
+        logger.error(f"Error in news retention: {e}")
+        return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_news_retention()
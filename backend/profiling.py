@@ -0,0 +1,220 @@
+import contextvars
+import cProfile
+import functools
+import inspect
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+# Opt-in switches. With both off nothing is installed and span() returns a shared no-op.
+REQUEST_PROFILING = os.getenv("TICKERTRACKER_PROFILE_REQUESTS", "0") == "1"
+CYCLE_PROFILING = os.getenv("TICKERTRACKER_PROFILE_CYCLES", "0") == "1"
+
+PROFILE_DIR = os.getenv(
+    "TICKERTRACKER_PROFILE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+)
+# Seconds between stack samples for the collapsed-stack (flamegraph) output
+SAMPLE_INTERVAL = 0.005
+
+_current = contextvars.ContextVar("tickertracker_profile", default=None)
+_NO_SPAN = nullcontext()
+# Makes file names unique between profiles started in the same second
+_profile_ids = itertools.count(1)
+# Only one cProfile can be enabled per process on Python 3.12+ (enable() raises ValueError otherwise)
+_cprofile_lock = threading.Lock()
+CPROFILE_SKIPPED_NOTE = "cProfile skipped (another profile was active); spans and sampled stacks only"
+
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's Python stack into collapsed-stack counts"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class Profile:
+    """cProfile stats, sampled stacks and per-stage span timings for one request or ingestion cycle"""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self.id = f"{os.getpid()}-{next(_profile_ids)}"
+        self.profiler = cProfile.Profile()
+        self.sampler = None
+        self.cprofile_skipped = False
+        self.spans = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def capture(self):
+        """
+        Profile the calling thread for the duration of the block. If another
+        profile holds cProfile, only spans and stack samples are collected.
+        """
+        self.sampler = _StackSampler(threading.get_ident())
+        self.sampler.start()
+        profiling = _cprofile_lock.acquire(blocking=False)
+        if profiling:
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # Some other tool (debugger, coverage) already owns the profiler
+                _cprofile_lock.release()
+                profiling = False
+        self.cprofile_skipped = not profiling
+        try:
+            yield self
+        finally:
+            if profiling:
+                self.profiler.disable()
+                _cprofile_lock.release()
+            self.sampler.stop()
+
+    def record(self, stage, elapsed):
+        with self.lock:
+            span = self.spans.setdefault(stage, {"count": 0, "seconds": 0.0})
+            span["count"] += 1
+            span["seconds"] += elapsed
+
+    def write(self, directory=PROFILE_DIR):
+        """Write <name>.pstats (unless cProfile was skipped), <name>.collapsed and <name>.spans.json. Returns the base path."""
+        os.makedirs(directory, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", self.name).strip("_")
+        base = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started))}-{self.id}-{slug}")
+
+        if not self.cprofile_skipped:
+            self.profiler.dump_stats(f"{base}.pstats")
+        if self.sampler is not None:
+            with open(f"{base}.collapsed", "w") as f:
+                for stack, count in self.sampler.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        with open(f"{base}.spans.json", "w") as f:
+            json.dump({"name": self.name, "wallSeconds": time.time() - self.started,
+                       "cprofileSkipped": self.cprofile_skipped, "spans": self.spans}, f, indent=2)
+        return base
+
+
+def span(stage):
+    """
+    Time a stage ("provider", "db", "mongo", "vader", "indicators", ...) of the
+    active profile. Returns a shared no-op context manager when nothing is being profiled.
+    """
+    profile = _current.get()
+    if profile is None:
+        return _NO_SPAN
+    return _timed(profile, stage)
+
+
+@contextmanager
+def _timed(profile, stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.record(stage, time.perf_counter() - started)
+
+
+@contextmanager
+def profile_cycle(name):
+    """Profile an ingestion cycle when TICKERTRACKER_PROFILE_CYCLES=1; otherwise does nothing"""
+    if not CYCLE_PROFILING:
+        yield None
+        return
+    profile = Profile(name)
+    token = _current.set(profile)
+    try:
+        with profile.capture():
+            yield profile
+    finally:
+        _current.reset(token)
+        print(f"Wrote profile {profile.write()}")
+        if profile.cprofile_skipped:
+            print(CPROFILE_SKIPPED_NOTE)
+
+
+# ---- API request profiling ----
+
+def wants_profile(request):
+    return request.headers.get("x-profile") == "1" or request.query_params.get("profile") == "1"
+
+
+def profiled_endpoint(fn):
+    """Wrap a route endpoint so it runs under the request's Profile, in whatever thread executes it"""
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            profile = _current.get()
+            if profile is None:
+                return await fn(*args, **kwargs)
+            with profile.capture():
+                return await fn(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return fn(*args, **kwargs)
+        with profile.capture():
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def install_request_profiling(app):
+    """
+    Let a request opt into profiling with an "X-Profile: 1" header or ?profile=1.
+    Must be called before routes are declared. Does nothing unless TICKERTRACKER_PROFILE_REQUESTS=1.
+    """
+    if not REQUEST_PROFILING:
+        return
+
+    from fastapi.routing import APIRoute
+    from starlette.concurrency import run_in_threadpool
+
+    class ProfiledRoute(APIRoute):
+        def __init__(self, path, endpoint, **kwargs):
+            super().__init__(path, profiled_endpoint(endpoint), **kwargs)
+
+    app.router.route_class = ProfiledRoute
+
+    @app.middleware("http")
+    async def profile_request(request, call_next):
+        if not wants_profile(request):
+            return await call_next(request)
+        profile = Profile(f"{request.method} {request.url.path}")
+        token = _current.set(profile)
+        try:
+            response = await call_next(request)
+        finally:
+            _current.reset(token)
+        # Writing (and dump_stats) is blocking file I/O; keep it off the event loop
+        response.headers["X-Profile-Path"] = os.path.basename(await run_in_threadpool(profile.write))
+        if profile.cprofile_skipped:
+            response.headers["X-Profile-Note"] = CPROFILE_SKIPPED_NOTE
+        return response
@@ -0,0 +1,355 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+import logging
+from profiling import span
+
+try:
+    import fcntl
+except ImportError:  # Windows: state is still shared, just without cross-process locking
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Per-provider limits. "rate" is tokens refilled per second and "burst" is the
+# bucket size. "quota" / "quota_window" cap the total calls in a rolling window
+# (NewsAPI developer plan allows 100 requests per 24 hours). With "shared_state"
+# the quota usage and breaker state are kept in a file so that every process
+# (the API and each one-shot data_fetchers run) sees and counts the same calls.
+PROVIDER_LIMITS = {
+    "yfinance": {
+        "rate": 2.0,
+        "burst": 5,
+        "max_wait": 5.0,
+        "failure_threshold": 5,
+        "reset_timeout": 60,
+        "quota": None,
+        "quota_window": None,
+    },
+    "newsapi": {
+        "rate": 1.0,
+        "burst": 2,
+        "max_wait": 2.0,
+        "failure_threshold": 3,
+        "reset_timeout": 300,
+        "quota": 100,
+        "quota_window": 24 * 60 * 60,
+        "shared_state": True,
+    },
+}
+
+# Where shared provider state is kept, next to the board snapshot by default
+PROVIDER_STATE_DIR = os.getenv(
+    "TICKERTRACKER_PROVIDER_STATE_DIR",
+    "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+)
+
+# How many last-known-good results to keep per provider
+LAST_GOOD_MAX_ENTRIES = 512
+
+
+class ProviderUnavailable(Exception):
+    """Raised when a provider cannot be called and no last-known-good data exists"""
+
+    def __init__(self, provider, reason):
+        super().__init__(f"{provider} unavailable: {reason}")
+        self.provider = provider
+        self.reason = reason
+
+
+class TokenBucket:
+    """Thread-safe token bucket"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        self.updated = now
+
+    def acquire(self, max_wait=0.0):
+        """Take one token, waiting up to max_wait seconds. Returns False if none was available in time."""
+        deadline = time.monotonic() + max_wait
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def available(self):
+        with self.lock:
+            self._refill(time.monotonic())
+            return round(self.tokens, 2)
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures, half-opens after `reset_timeout` seconds"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        """Whether a call may go upstream. Only one trial call is let through while half-open."""
+        with self.lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def release_trial(self):
+        with self.lock:
+            self.trial_in_flight = False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.failure_threshold:
+                # Re-arm the cooldown on every failure while open or half-open
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+
+class ProviderGovernor:
+    """Rate limit, quota and circuit breaker for a single upstream provider"""
+
+    def __init__(self, name, rate, burst, max_wait, failure_threshold, reset_timeout,
+                 quota=None, quota_window=None, shared_state=False):
+        self.name = name
+        self.state_path = os.path.join(PROVIDER_STATE_DIR, f"tickertracker_{name}.json") if shared_state else None
+        self.max_wait = max_wait
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.quota = quota
+        self.quota_window = quota_window
+        self.quota_calls = []
+        self.last_good = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"calls": 0, "successes": 0, "failures": 0, "throttled": 0,
+                      "short_circuited": 0, "stale_served": 0}
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def _load_state(self, state):
+        with self.lock:
+            self.quota_calls = state.get("quotaCalls", [])
+        with self.breaker.lock:
+            self.breaker.failures = state.get("failures", 0)
+            opened_at = state.get("openedAt")
+            # Stored as wall-clock time; the breaker works in this process's monotonic clock
+            self.breaker.opened_at = None if opened_at is None else time.monotonic() - (time.time() - opened_at)
+
+    def _dump_state(self):
+        with self.lock:
+            cutoff = time.time() - (self.quota_window or 0)
+            quota_calls = [t for t in self.quota_calls if t > cutoff] if self.quota is not None else []
+        with self.breaker.lock:
+            opened_at = self.breaker.opened_at
+            failures = self.breaker.failures
+        return {
+            "quotaCalls": quota_calls,
+            "failures": failures,
+            "openedAt": None if opened_at is None else time.time() - (time.monotonic() - opened_at),
+        }
+
+    @contextmanager
+    def _shared_state(self):
+        """Load quota usage and breaker state from the state file for the block, then write them back"""
+        if self.state_path is None:
+            yield
+            return
+        try:
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            fd = os.open(self.state_path, os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError as e:
+            logger.warning(f"Cannot open {self.name} state file, using in-process state: {e}")
+            yield
+            return
+        with os.fdopen(fd, "r+") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                state = json.loads(f.read() or "{}")
+            except ValueError:
+                state = {}
+            self._load_state(state)
+            yield
+            f.seek(0)
+            f.truncate()
+            json.dump(self._dump_state(), f)
+            f.flush()
+
+    def _take_quota(self):
+        if self.quota is None:
+            return True
+        with self.lock:
+            cutoff = time.time() - self.quota_window
+            self.quota_calls = [t for t in self.quota_calls if t > cutoff]
+            if len(self.quota_calls) >= self.quota:
+                return False
+            self.quota_calls.append(time.time())
+            return True
+
+    def exhaust_quota(self):
+        """Mark the quota as used up, e.g. after the provider reports a rate-limit error"""
+        if self.quota is None:
+            return
+        with self._shared_state():
+            with self.lock:
+                now = time.time()
+                self.quota_calls = [now] * self.quota
+
+    def quota_remaining(self):
+        if self.quota is None:
+            return None
+        with self.lock:
+            cutoff = time.time() - self.quota_window
+            return self.quota - len([t for t in self.quota_calls if t > cutoff])
+
+    def _stale(self, key, reason):
+        with self.lock:
+            if key is not None and key in self.last_good:
+                self.stats["stale_served"] += 1
+                return self.last_good[key]
+        raise ProviderUnavailable(self.name, reason)
+
+    def _remember(self, key, value):
+        if key is None:
+            return
+        with self.lock:
+            self.last_good[key] = value
+            self.last_good.move_to_end(key)
+            while len(self.last_good) > LAST_GOOD_MAX_ENTRIES:
+                self.last_good.popitem(last=False)
+
+    def call(self, key, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) against the provider. While the breaker is open,
+        the bucket is empty or the quota is spent, the last good result for `key`
+        is returned instead; if there is none, ProviderUnavailable is raised.
+        Errors from fn also fall back to the last good result when one exists.
+        """
+        self._count("calls")
+
+        with self._shared_state():
+            allowed = self.breaker.allow()
+        if not allowed:
+            self._count("short_circuited")
+            return self._stale(key, "circuit open")
+
+        throttled = not self.bucket.acquire(self.max_wait)
+        if not throttled:
+            with self._shared_state():
+                throttled = not self._take_quota()
+        if throttled:
+            # Release a half-open trial slot we did not use
+            self.breaker.release_trial()
+            self._count("throttled")
+            return self._stale(key, "rate limited")
+
+        try:
+            with span(f"provider:{self.name}"):
+                result = fn(*args, **kwargs)
+        except Exception as e:
+            with self._shared_state():
+                self.breaker.record_failure()
+            self._count("failures")
+            logger.warning(f"{self.name} call failed ({self.breaker.state}): {e}")
+            try:
+                return self._stale(key, str(e))
+            except ProviderUnavailable:
+                raise e
+
+        with self._shared_state():
+            self.breaker.record_success()
+        self._count("successes")
+        self._remember(key, result)
+        return result
+
+    def status(self):
+        """
+        Current state. For shared-state providers the circuit and quota cover
+        every process; tokens, cache and stats are always this process's own.
+        """
+        with self._shared_state():
+            circuit = self.breaker.state
+            failures = self.breaker.failures
+            quota_remaining = self.quota_remaining()
+        with self.lock:
+            stats = dict(self.stats)
+            cached = len(self.last_good)
+        return {
+            "provider": self.name,
+            "sharedState": self.state_path is not None,
+            "circuit": circuit,
+            "consecutiveFailures": failures,
+            "tokensAvailable": self.bucket.available(),
+            "quota": self.quota,
+            "quotaRemaining": quota_remaining,
+            "lastGoodEntries": cached,
+            "stats": stats,
+        }
+
+
+_governors = {}
+_governors_lock = threading.Lock()
+
+
+def get_governor(provider):
+    """Get the shared governor for a provider, creating it from PROVIDER_LIMITS on first use"""
+    with _governors_lock:
+        if provider not in _governors:
+            _governors[provider] = ProviderGovernor(provider, **PROVIDER_LIMITS[provider])
+        return _governors[provider]
+
+
+def governed_call(provider, key, fn, *args, **kwargs):
+    """Call fn through the named provider's governor"""
+    return get_governor(provider).call(key, fn, *args, **kwargs)
+
+
+def provider_status():
+    """State of every configured provider"""
+    return [get_governor(name).status() for name in PROVIDER_LIMITS]
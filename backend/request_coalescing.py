@@ -0,0 +1,231 @@
+import asyncio
+import functools
+import inspect
+import threading
+
+
+# Result handed to async followers when their leader is cancelled
+_HANDOFF = object()
+
+
+class _InFlight:
+    """A computation that concurrent sync callers can wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls that share a key into one execution.
+    The first caller for a key runs the function; everyone arriving while it
+    is still running waits for and shares its result (or its exception).
+    If an async leader is cancelled, one of its followers takes over the call.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.async_in_flight = {}
+        self.stats = {"calls": 0, "executions": 0, "collapsed": 0, "handoffs": 0}
+
+    def _count(self, leader):
+        self.stats["calls"] += 1
+        self.stats["executions" if leader else "collapsed"] += 1
+
+    def do(self, key, fn, *args, **kwargs):
+        with self.lock:
+            call = self.in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self.in_flight[key] = _InFlight()
+            self._count(leader)
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            call.event.set()
+
+    async def do_async(self, key, fn, *args, **kwargs):
+        # Only touched from the event loop thread, but stats are shared with do()
+        first_attempt = True
+        while True:
+            future = self.async_in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self.async_in_flight[key] = asyncio.get_running_loop().create_future()
+            with self.lock:
+                if first_attempt:
+                    self._count(leader)
+                elif leader:
+                    # A follower taking over from a cancelled leader ran the call after all
+                    self.stats["executions"] += 1
+                    self.stats["collapsed"] -= 1
+                    self.stats["handoffs"] += 1
+            first_attempt = False
+
+            if not leader:
+                # Shield so one follower being cancelled doesn't cancel the shared future
+                result = await asyncio.shield(future)
+                if result is _HANDOFF:
+                    # The leader was cancelled; the first follower to loop round becomes the new leader
+                    continue
+                return result
+
+            try:
+                result = await fn(*args, **kwargs)
+                future.set_result(result)
+                return result
+            except asyncio.CancelledError:
+                # Only this caller went away (e.g. client disconnect); wake the followers so
+                # one of them redoes the work instead of cancelling requests still being waited on
+                future.set_result(_HANDOFF)
+                raise
+            except Exception as e:
+                future.set_exception(e)
+                # Mark the exception as retrieved in case nobody else was waiting
+                future.exception()
+                raise
+            finally:
+                del self.async_in_flight[key]
+
+    def status(self):
+        with self.lock:
+            return {
+                "name": self.name,
+                "inFlight": len(self.in_flight) + len(self.async_in_flight),
+                **self.stats,
+            }
+
+
+_groups = {}
+_groups_lock = threading.Lock()
+
+
+def get_group(name):
+    """Get the shared SingleFlight group for a route, creating it on first use"""
+    with _groups_lock:
+        if name not in _groups:
+            _groups[name] = SingleFlight(name)
+        return _groups[name]
+
+
+def coalesce(name, key=None):
+    """
+    Decorator for sync or async route handlers. `key` is called with the
+    handler's arguments (as keywords, defaults applied) and returns a hashable
+    key; requests with equal keys share one execution. By default every
+    argument is part of the key.
+    """
+    def decorator(fn):
+        group = get_group(name)
+        signature = inspect.signature(fn)
+
+        def make_key(args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            if key is not None:
+                return key(**bound.arguments)
+            return tuple(bound.arguments.items())
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                return await group.do_async(make_key(args, kwargs), fn, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return group.do(make_key(args, kwargs), fn, *args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def coalescing_status():
+    """Metrics for every coalescing group"""
+    with _groups_lock:
+        groups = list(_groups.values())
+    return [group.status() for group in groups]
+
+
+# Test function
+def test_request_coalescing():
+    """Hit slow stub providers concurrently and check the calls were collapsed"""
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    print("Testing request coalescing...")
+    upstream_calls = []
+
+    @coalesce("test-sync", key=lambda market, ticker_id: (market.upper(), ticker_id.upper()))
+    def slow_history(market, ticker_id):
+        upstream_calls.append((market, ticker_id))
+        time.sleep(0.2)
+        return {"ticker": ticker_id.upper(), "market": market.upper()}
+
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        results = list(pool.map(lambda i: slow_history("us", "aapl" if i % 2 else "AAPL"), range(20)))
+    assert all(r == {"ticker": "AAPL", "market": "US"} for r in results)
+    assert len(upstream_calls) == 1, upstream_calls
+    print(f"sync: {get_group('test-sync').status()}")
+
+    async_calls = []
+
+    @coalesce("test-async")
+    async def slow_insights(market, ticker_id):
+        async_calls.append((market, ticker_id))
+        await asyncio.sleep(0.2)
+        if ticker_id == "FAIL":
+            raise RuntimeError("upstream failed")
+        return f"insights for {ticker_id}"
+
+    async def run_async():
+        ok = await asyncio.gather(*[slow_insights("US", "MSFT") for _ in range(10)],
+                                  *[slow_insights("US", "TSLA") for _ in range(10)])
+        failed = await asyncio.gather(*[slow_insights("US", "FAIL") for _ in range(5)],
+                                      return_exceptions=True)
+        return ok, failed
+
+    async def run_cancelled_leader():
+        leader = asyncio.create_task(slow_insights("US", "NVDA"))
+        await asyncio.sleep(0.05)
+        followers = [asyncio.create_task(slow_insights("US", "NVDA")) for _ in range(5)]
+        await asyncio.sleep(0.05)
+        # Client of the leading request disconnects
+        leader.cancel()
+        results = await asyncio.gather(*followers)
+        return leader.cancelled(), results
+
+    ok, failed = asyncio.run(run_async())
+    assert ok == ["insights for MSFT"] * 10 + ["insights for TSLA"] * 10
+    assert all(isinstance(e, RuntimeError) for e in failed)
+    assert len(async_calls) == 3, async_calls
+
+    leader_cancelled, results = asyncio.run(run_cancelled_leader())
+    assert leader_cancelled
+    assert results == ["insights for NVDA"] * 5, results
+    # The cancelled leader's call plus one follower taking over
+    assert async_calls.count(("US", "NVDA")) == 2, async_calls
+    assert get_group("test-async").stats["handoffs"] == 1
+    print(f"async: {get_group('test-async').status()}")
+    print("Request coalescing OK")
+
+
+if __name__ == "__main__":
+    test_request_coalescing()
@@ -0,0 +1,203 @@
+import csv
+import heapq
+import os
+import threading
+import time
+from bisect import bisect_left
+from market_config import MARKET_CONFIG, POPULAR_TICKERS, get_full_symbol, get_base_symbol
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# How often (seconds) to stat the listing files for changes
+REFRESH_CHECK_INTERVAL = 5.0
+
+# Column names used by the listing formats we accept: our own symbol,name CSV,
+# NASDAQ Trader's pipe-delimited nasdaqlisted/otherlisted files and NSE's EQUITY_L.csv
+SYMBOL_COLUMNS = ["symbol", "Symbol", "SYMBOL", "ACT Symbol"]
+NAME_COLUMNS = ["name", "Security Name", "NAME OF COMPANY", "Company Name"]
+
+# Ranking tiers, best first
+EXACT_SYMBOL, SYMBOL_PREFIX, NAME_PREFIX, NAME_WORD_PREFIX = range(4)
+
+
+def load_listing(path, market):
+    """Read a listing file into a list of instruments. Falls back to POPULAR_TICKERS if the file is missing."""
+    if not os.path.exists(path):
+        return [
+            {"symbol": get_base_symbol(ticker, market), "full_symbol": ticker, "name": get_base_symbol(ticker, market), "market": market}
+            for ticker in POPULAR_TICKERS.get(market, [])
+        ]
+
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        first_line = f.readline()
+        f.seek(0)
+        delimiter = "|" if "|" in first_line else ","
+        reader = csv.DictReader(f, delimiter=delimiter, skipinitialspace=True)
+        symbol_column = next((c for c in SYMBOL_COLUMNS if c in (reader.fieldnames or [])), None)
+        name_column = next((c for c in NAME_COLUMNS if c in (reader.fieldnames or [])), None)
+        if symbol_column is None:
+            raise ValueError(f"No symbol column in {path}")
+
+        instruments = []
+        seen = set()
+        for row in reader:
+            symbol = (row.get(symbol_column) or "").strip().upper()
+            # NASDAQ Trader files end with a "File Creation Time" line
+            if not symbol or symbol.startswith("FILE CREATION TIME") or symbol in seen:
+                continue
+            seen.add(symbol)
+            name = (row.get(name_column) or "").strip() if name_column else ""
+            instruments.append({
+                "symbol": symbol,
+                "full_symbol": get_full_symbol(symbol, market),
+                "name": name or symbol,
+                "market": market,
+            })
+    return instruments
+
+
+class MarketIndex:
+    """
+    Sorted-array prefix index over one market's symbols and company names.
+    Keys are grouped by symbol length so matches come out in ranking order
+    without walking every key that shares a short prefix.
+    """
+
+    def __init__(self, market, instruments):
+        self.instruments = instruments
+        popular = set(POPULAR_TICKERS.get(market, []))
+        self.popular = [item["full_symbol"] in popular for item in instruments]
+        # Popular tickers are few and always ranked ahead in their tier, so they are checked one by one
+        self.popular_ids = [i for i, is_popular in enumerate(self.popular) if is_popular]
+
+        symbols = {}
+        names = {}
+        for i, item in enumerate(instruments):
+            length = len(item["symbol"])
+            symbols.setdefault(length, []).append((item["symbol"].lower(), i))
+            # Index the name from every word onwards so "bank" and "bank of" both match "State Bank of India"
+            words = item["name"].lower().split()
+            for start in range(len(words)):
+                tier = NAME_PREFIX if start == 0 else NAME_WORD_PREFIX
+                names.setdefault((tier, length), []).append((" ".join(words[start:]), i))
+
+        self.lengths = sorted(symbols)
+        self.symbol_groups = {length: self._group(entries) for length, entries in symbols.items()}
+        self.name_groups = {key: self._group(entries) for key, entries in names.items()}
+
+    @staticmethod
+    def _group(entries):
+        entries.sort()
+        return [key for key, _ in entries], [i for _, i in entries]
+
+    @staticmethod
+    def _prefix_range(keys, prefix):
+        return range(bisect_left(keys, prefix), bisect_left(keys, prefix + "\U0010ffff"))
+
+    def tier(self, i, query):
+        """Best tier at which instrument i matches a lowercased query, or None"""
+        item = self.instruments[i]
+        symbol = item["symbol"].lower()
+        if symbol == query:
+            return EXACT_SYMBOL
+        if symbol.startswith(query):
+            return SYMBOL_PREFIX
+        words = item["name"].lower().split()
+        if " ".join(words).startswith(query):
+            return NAME_PREFIX
+        if any(" ".join(words[start:]).startswith(query) for start in range(1, len(words))):
+            return NAME_WORD_PREFIX
+        return None
+
+    def candidates(self, query, limit):
+        """
+        (tier, instrument index) pairs for a lowercased query: every popular match
+        plus the best `limit` other matches by (tier, symbol length, symbol)
+        """
+        found = {}
+        for i in self.popular_ids:
+            tier = self.tier(i, query)
+            if tier is not None:
+                found[i] = tier
+
+        groups = []
+        if len(query) in self.symbol_groups:
+            groups.append((EXACT_SYMBOL, self.symbol_groups[len(query)]))
+        groups += [(SYMBOL_PREFIX, self.symbol_groups[length]) for length in self.lengths]
+        groups += [(tier, self.name_groups[(tier, length)])
+                   for tier in (NAME_PREFIX, NAME_WORD_PREFIX) for length in self.lengths
+                   if (tier, length) in self.name_groups]
+
+        need = limit
+        for tier, (keys, ids) in groups:
+            if need <= 0:
+                break
+            if tier == EXACT_SYMBOL:
+                matches = {ids[k] for k in self._prefix_range(keys, query) if keys[k] == query}
+            else:
+                matches = {ids[k] for k in self._prefix_range(keys, query)}
+            matches = [i for i in matches if i not in found and not self.popular[i]]
+            # Within a group every match has the same tier and symbol length, so the symbol decides
+            for i in heapq.nsmallest(need, matches, key=lambda i: self.instruments[i]["symbol"]):
+                found[i] = tier
+                need -= 1
+        return found.items()
+
+
+class SymbolUniverse:
+    """All instruments across markets, rebuilding a market's index when its listing file changes"""
+
+    def __init__(self, markets=None, check_interval=REFRESH_CHECK_INTERVAL):
+        self.markets = markets or {
+            market: os.path.join(BACKEND_DIR, config["listing_file"])
+            for market, config in MARKET_CONFIG.items() if config.get("listing_file")
+        }
+        self.check_interval = check_interval
+        self.indexes = {}
+        self.mtimes = {}
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.checked_at < self.check_interval:
+            return
+        with self.lock:
+            self.checked_at = now
+            indexes = dict(self.indexes)
+            for market, path in self.markets.items():
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except OSError:
+                    mtime = None
+                if market in indexes and self.mtimes.get(market) == mtime:
+                    continue
+                # Only the market whose file changed is rebuilt; searches keep using the old indexes until the swap
+                indexes[market] = MarketIndex(market, load_listing(path, market))
+                self.mtimes[market] = mtime
+            self.indexes = indexes
+
+    def size(self):
+        return sum(len(index.instruments) for index in self.indexes.values())
+
+    def search(self, query, market=None, limit=10):
+        """Ranked matches on symbol or company name prefix"""
+        self.refresh()
+        query = " ".join(query.lower().split())
+        if not query:
+            return []
+
+        indexes = self.indexes
+        if market is not None:
+            indexes = {market: indexes[market]} if market in indexes else {}
+
+        ranked = []
+        for index in indexes.values():
+            for i, tier in index.candidates(query, limit):
+                item = index.instruments[i]
+                ranked.append((tier, not index.popular[i], len(item["symbol"]), item["symbol"], item["market"], item))
+        ranked.sort(key=lambda entry: entry[:5])
+        return [entry[-1] for entry in ranked[:limit]]
+
+
+symbol_universe = SymbolUniverse()
@@ -2,6 +2,9 @@ import React, { useState, useEffect } from 'react';
 import './App.css';
 import PriceChart from './components/PriceChart';
 
+// Upper bound on points the backend returns for a chart, whatever the period
+const CHART_MAX_POINTS = 500;
+
 function App() {
   const [ticker, setTicker] = useState('AAPL');
   const [market, setMarket] = useState('US');
@@ -55,7 +58,7 @@ function App() {
       setInsightsData(insightsJson);
 
       // 4. Fetch Historical Data for Chart
-      const historyResponse = await fetch(`http://localhost:8000/api/ticker/${market}/${ticker}/history?period=${chartPeriod}`);
+      const historyResponse = await fetch(`http://localhost:8000/api/ticker/${market}/${ticker}/history?period=${chartPeriod}&max_points=${CHART_MAX_POINTS}`);
       if (historyResponse.ok) {
         const historyJson = await historyResponse.json();
         setHistoricalData(historyJson.data || []);
@@ -116,6 +116,8 @@ const PriceChart = ({ ticker, market, historicalData }) => {
         pointBorderColor: '#fff',
         pointHoverBackgroundColor: '#fff',
         pointHoverBorderColor: 'rgb(59, 130, 246)',
+        // Drawing a marker per point gets slow on long ranges
+        pointRadius: historicalData.length > 100 ? 0 : 3,
       },
     ],
   };